@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """
+    Bounded mapping which evicts the least recently used entry
+    once more than `maxsize` entries are stored.
+    Entries may also expire `ttl` seconds after being stored, and `on_evict(value)`
+    is called for every value leaving the cache (eviction, expiry, replacement or clear).
+    Expired entries are swept on every get and put, even if they are never looked up again.
+    Keeps track of hits and misses so that its efficiency can be observed.
+    The cache may be shared between threads: every operation runs under a lock,
+    on_evict included, so on_evict must not use the cache.
+    """
+    def __init__(self, maxsize: int = 128, ttl: float = None, on_evict=None, clock=time.monotonic):
+        if maxsize < 0:
+            raise ValueError(f"Unauthorized value for maxsize")
+        if ttl is not None and ttl <= 0:
+            raise ValueError(f"Unauthorized value for ttl")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.clock = clock
+        self._entries = OrderedDict()
+        # Keys in the order they were stored, which is also their order of expiry
+        self._stored = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _discard(self, value):
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+    def _expire(self):
+        """
+        Drops the expired entries, starting from the oldest stored one (called with the lock held)
+        """
+        if self.ttl is None:
+            return
+
+        now = self.clock()
+        while self._stored:
+            key = next(iter(self._stored))
+            value, expires = self._entries[key]
+            if expires > now:
+                return
+            del self._stored[key]
+            del self._entries[key]
+            self._discard(value)
+            self.expirations += 1
+
+    def get(self, key):
+        """
+        Returns the value stored under `key` (marking it as recently used), or None
+        """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.maxsize == 0:
+            self._discard(value)
+            return
+
+        with self._lock:
+            self._expire()
+            expires = self.clock() + self.ttl if self.ttl is not None else None
+            old = self._entries.pop(key, None)
+            if old is not None and old[0] is not value:
+                self._discard(old[0])
+
+            self._entries[key] = (value, expires)
+            self._stored[key] = None
+            self._stored.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted_key, (evicted, _) = self._entries.popitem(last=False)
+                del self._stored[evicted_key]
+                self._discard(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._stored.clear()
+            while self._entries:
+                _, (value, _) = self._entries.popitem(last=False)
+                self._discard(value)
+
+    def info(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+# --- Example of use and test ---
+if __name__ == '__main__':
+    cache = LRUCache(2)
+    cache.put(b"a", 1)
+    cache.put(b"b", 2)
+    assert cache.get(b"a") == 1
+    cache.put(b"c", 3)
+    assert b"b" not in cache
+    assert cache.get(b"b") is None
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 1
+
+    now = [0.0]
+    evicted = []
+    cache = LRUCache(2, ttl=10, on_evict=evicted.append, clock=lambda: now[0])
+    cache.put(b"a", 1)
+    now[0] = 10
+    assert cache.get(b"a") is None and evicted == [1]
+
+    # b"b" expires while b"c" is stored, without being looked up
+    cache.put(b"b", 2)
+    now[0] = 20
+    cache.put(b"c", 3)
+    assert evicted == [1, 2] and b"b" not in cache
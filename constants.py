@@ -12,4 +12,11 @@ ZETAS = [1, 1729, 2580, 3289, 2642, 630, 1897, 848, 1062, 1919, 193, 797, 2786,
         17, 2761, 583, 2649, 1637, 723, 2288, 1100, 1409, 2662, 3281, 233, 756, 2156, 3015, 3050, 
         1703, 1651, 2789, 1789, 1847, 952, 1461, 2687, 939, 2308, 2437, 2388, 733, 2337, 268, 641, 
         1584, 2298, 2037, 3220, 375, 2549, 2090, 1645, 1063, 319, 2773, 757, 2099, 561, 2466, 2594, 
-        2804, 1092, 403, 1026, 1143, 2150, 2775, 886, 1722, 1212, 1874, 1029, 2110, 2935, 885, 2154]
\ No newline at end of file
+        2804, 1092, 403, 1026, 1143, 2150, 2775, 886, 1722, 1212, 1874, 1029, 2110, 2935, 885, 2154]
+
+# Parameter sets of Table 2 (FIPS 203), indexed by their security category name
+PARAMETER_SETS = {
+    512: {"k": 2, "eta_1": 3, "eta_2": 2, "d_u": 10, "d_v": 4},
+    768: {"k": 3, "eta_1": 2, "eta_2": 2, "d_u": 10, "d_v": 4},
+    1024: {"k": 4, "eta_1": 2, "eta_2": 2, "d_u": 11, "d_v": 5},
+}
@@ -2,6 +2,13 @@ from constants import CONST_d, Q, N
 
 def round_up(x):
     return int(x + 0.5)
+
+def byte_view(B) -> memoryview:
+    """
+    Flat byte memoryview over any buffer-protocol object (bytes, bytearray, memoryview, array...),
+    so that it can be sliced without copying
+    """
+    return memoryview(B).cast("B")
     
 """
 Compression and decompression functions
@@ -103,6 +110,44 @@ def ByteDecode(B: bytes, d=CONST_d):
             F[i] = (F[i] + b[i*d + j] * (2**j)) % m
     return F
 
+"""
+Tables used by out_of_range_flags, applied with bytes.translate.
+Each one maps a byte to 1 when the condition holds, and to 0 otherwise.
+"""
+_LOW_NIBBLE_ABOVE = bytes(int(x & 0x0F > (Q >> 8)) for x in range(256))
+_LOW_NIBBLE_EQUAL = bytes(int(x & 0x0F == (Q >> 8)) for x in range(256))
+_HIGH_NIBBLE_NONZERO = bytes(int(x >> 4 != 0) for x in range(256))
+_NONZERO = bytes(int(x != 0) for x in range(256))
+_ABOVE = bytes(int(x > (Q >> 4)) for x in range(256))
+_EQUAL = bytes(int(x == (Q >> 4)) for x in range(256))
+
+""" 
+Flags the 12-bit integers of a ByteEncode_12 output which are not in Z_Q,
+i.e. the ones that ByteDecode_12 would silently reduce.
+Every 3 bytes (b0, b1, b2) hold two integers : b0 + 256*(b1 % 16) and b1 // 16 + 16*b2,
+and with Q = 0xD01 the comparisons only need the bytes themselves. All of them are done
+with bytes.translate and big integer operations, so that no Python loop runs over the coefficients.
+
+Input : B in B^(3*r)
+Output : F in B^r, where F[i] = 1 if one of the two integers held by B[3*i:3*i+3] is >= Q, and 0 otherwise
+"""
+def out_of_range_flags(B: bytes) -> bytes:
+    if len(B) % 3 != 0:
+        raise ValueError(f"Unauthorized length for B")
+
+    B = bytes(B)
+    b0, b1, b2 = B[0::3], B[1::3], B[2::3]
+
+    def mask(data: bytes, table: bytes) -> int:
+        return int.from_bytes(data.translate(table), "big")
+
+    bad = mask(b1, _LOW_NIBBLE_ABOVE) | (mask(b1, _LOW_NIBBLE_EQUAL) & mask(b0, _NONZERO))
+    bad |= mask(b2, _ABOVE) | (mask(b2, _EQUAL) & mask(b1, _HIGH_NIBBLE_NONZERO))
+    return bad.to_bytes(len(b0), "big")
+
+def coefficients_below_Q(B: bytes) -> bool:
+    return b"\x01" not in out_of_range_flags(B)
+
 # --- Example of use and test ---
 if __name__ == '__main__':
     assert Compress(1933, 11) == 1189
@@ -129,4 +174,8 @@ if __name__ == '__main__':
 
     F = SampleNTT(b"Salut de la part de moi meme le ka").coeffs
     F_rev = ByteDecode(ByteEncode(F))
-    assert F == F_rev
\ No newline at end of file
+    assert F == F_rev
+
+    assert coefficients_below_Q(ByteEncode(F))
+    assert not coefficients_below_Q(bytes([0x00, 0x10, 0xD0]) + ByteEncode(F))
+    assert out_of_range_flags(bytes([0x01, 0x0D, 0x00, 0x00, 0x00, 0x00])) == bytes([1, 0])
\ No newline at end of file
@@ -0,0 +1,182 @@
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from Crypto.Cipher import AES
+from hash import J
+from kem_scheme import ML_KEM
+
+"""
+Hybrid KEM-DEM encryption of large payloads.
+
+The shared secret K of a single ML_KEM.Encaps is turned into an AES-256-GCM key,
+and the payload is encrypted chunk by chunk so that memory use does not depend on its size.
+
+Layout of an encrypted stream :
+    header = MAGIC || version (1) || parameter set (2) || chunk size (4) || len(c) (2) || c
+    then one record per chunk : AES-GCM(chunk) || tag (16)
+
+The nonce of a chunk is its index followed by a byte flagging the last chunk,
+so reordering, dropping or truncating chunks is detected. The header is bound to the key.
+"""
+
+MAGIC = b"MLKD"
+VERSION = 1
+DEFAULT_CHUNK_SIZE = 1 << 16
+# Upper bound on the chunk size, also enforced on the (unauthenticated) header when decrypting
+MAX_CHUNK_SIZE = 1 << 24
+TAG_LENGTH = 16
+
+_HEADER_FORMAT = ">4sBHIH"
+_HEADER_LENGTH = struct.calcsize(_HEADER_FORMAT)
+
+def derive_key(K: bytes, header: bytes) -> bytes:
+    """
+    Derives the DEM key from the shared secret and the header carrying c
+    """
+    return J(bytes(K) + header)
+
+def _nonce(index: int, is_last: bool) -> bytes:
+    return index.to_bytes(11, "big") + bytes([is_last])
+
+def _encrypt_chunk(key: bytes, index: int, chunk: bytes, is_last: bool) -> bytes:
+    cipher = AES.new(key, AES.MODE_GCM, nonce=_nonce(index, is_last), mac_len=TAG_LENGTH)
+    ciphertext, tag = cipher.encrypt_and_digest(chunk)
+    return ciphertext + tag
+
+def _decrypt_chunk(key: bytes, index: int, record: bytes, is_last: bool) -> bytes:
+    if len(record) < TAG_LENGTH:
+        raise ValueError(f"Truncated record in encrypted stream")
+
+    cipher = AES.new(key, AES.MODE_GCM, nonce=_nonce(index, is_last), mac_len=TAG_LENGTH)
+    try:
+        return cipher.decrypt_and_verify(record[:-TAG_LENGTH], record[-TAG_LENGTH:])
+    except ValueError:
+        raise ValueError(f"Authentication failed for chunk {index}") from None
+
+def _read_exactly(src, size: int) -> bytes:
+    """
+    Reads `size` bytes from `src`, or fewer only if the stream ends.
+    Raw streams, pipes and custom readers may return fewer bytes than asked while not at the end.
+    """
+    data = src.read(size)
+    if not data or len(data) == size:
+        return data
+
+    parts = [data]
+    remaining = size - len(data)
+    while remaining:
+        part = src.read(remaining)
+        if not part:
+            break
+        parts.append(part)
+        remaining -= len(part)
+    return b"".join(parts)
+
+def _read_blocks(src, size: int):
+    """
+    Yields (index, block, is_last) reading `size` bytes at a time, with one block of lookahead.
+    At least one (possibly empty) block is always produced.
+    """
+    index = 0
+    block = _read_exactly(src, size)
+    while True:
+        next_block = _read_exactly(src, size)
+        is_last = not next_block
+        yield index, block, is_last
+        if is_last:
+            return
+        index += 1
+        block = next_block
+
+def _process(key: bytes, blocks, fn, dst, workers: int):
+    """
+    Applies `fn` to every block and writes the results in order.
+    With several workers, at most 2 * workers blocks are in flight at any time.
+    """
+    if workers <= 1:
+        for index, block, is_last in blocks:
+            dst.write(fn(key, index, block, is_last))
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for index, block, is_last in blocks:
+            pending.append(pool.submit(fn, key, index, block, is_last))
+            if len(pending) >= 2 * workers:
+                dst.write(pending.popleft().result())
+        while pending:
+            dst.write(pending.popleft().result())
+
+"""
+Encrypts the binary stream `src` into `dst` for the holder of the decapsulation key matching `ek`.
+
+Input : ML-KEM scheme kem (one of the standard parameter sets)
+Input : encapsulation key ek in B^(384*k + 32)
+Input : readable binary stream src, writable binary stream dst
+"""
+def encrypt_stream(kem: ML_KEM, ek: bytes, src, dst, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1):
+    if kem.parameter_set is None:
+        raise ValueError(f"Only the standard parameter sets can be used for hybrid encryption")
+    if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+        raise ValueError(f"Unauthorized value for chunk_size")
+
+    K, c = kem.Encaps(ek)
+    header = struct.pack(_HEADER_FORMAT, MAGIC, VERSION, kem.parameter_set, chunk_size, len(c)) + c
+    dst.write(header)
+
+    key = derive_key(K, header)
+    _process(key, _read_blocks(src, chunk_size), _encrypt_chunk, dst, workers)
+
+"""
+Decrypts a stream produced by encrypt_stream.
+Chunks are written to `dst` as soon as they are authenticated: if a ValueError is raised,
+the data already written must be discarded.
+
+Input : ML-KEM scheme kem, with the parameter set recorded in the header
+Input : decapsulation key dk in B^(768*k + 96) (or in seed form)
+Input : readable binary stream src, writable binary stream dst
+"""
+def decrypt_stream(kem: ML_KEM, dk: bytes, src, dst, workers: int = 1):
+    fixed = _read_exactly(src, _HEADER_LENGTH)
+    if len(fixed) != _HEADER_LENGTH:
+        raise ValueError(f"Truncated header")
+
+    magic, version, parameter_set, chunk_size, c_length = struct.unpack(_HEADER_FORMAT, fixed)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not an ML-KEM hybrid encrypted stream")
+    if parameter_set != kem.parameter_set:
+        raise ValueError(f"Stream was encrypted with ML-KEM-{parameter_set}")
+    if chunk_size == 0 or chunk_size > MAX_CHUNK_SIZE or c_length != 32 * (kem.pke.d_u * kem.pke.k + kem.pke.d_v):
+        raise ValueError(f"Malformed header")
+
+    c = _read_exactly(src, c_length)
+    if len(c) != c_length:
+        raise ValueError(f"Truncated header")
+
+    K = kem.Decaps(dk, c)
+    key = derive_key(K, fixed + c)
+    _process(key, _read_blocks(src, chunk_size + TAG_LENGTH), _decrypt_chunk, dst, workers)
+
+def encrypt_file(kem: ML_KEM, ek: bytes, in_path, out_path, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1):
+    with open(in_path, "rb") as src, open(out_path, "wb") as dst:
+        encrypt_stream(kem, ek, src, dst, chunk_size, workers)
+
+def decrypt_file(kem: ML_KEM, dk: bytes, in_path, out_path, workers: int = 1):
+    with open(in_path, "rb") as src, open(out_path, "wb") as dst:
+        decrypt_stream(kem, dk, src, dst, workers)
+
+# --- Example of use and test ---
+if __name__ == '__main__':
+    import io
+    import secrets
+
+    kem_scheme = ML_KEM.from_parameter_set(768)
+    ek, dk = kem_scheme.KeyGen()
+
+    payload = secrets.token_bytes(100_000)
+    encrypted = io.BytesIO()
+    encrypt_stream(kem_scheme, ek, io.BytesIO(payload), encrypted, chunk_size=4096, workers=4)
+
+    decrypted = io.BytesIO()
+    decrypt_stream(kem_scheme, dk, io.BytesIO(encrypted.getvalue()), decrypted)
+    assert decrypted.getvalue() == payload
@@ -1,14 +1,59 @@
 import secrets
+import time
+from itertools import islice
 from pke_scheme import *
 from hash import H, G, J
+from cache import LRUCache
+from constants import PARAMETER_SETS
+
+# A decapsulation key can be stored in seed form: the 64 bytes (d, z) given to KeyGen_internal
+SEED_DK_LENGTH = 64
+
+# Number of keys checked together by validate_ek_batch
+VALIDATION_SLICE = 4096
+
+def _wipe(secret: bytearray):
+    secret[:] = bytes(len(secret))
 
 class ML_KEM:
     """
     Implements the ML-KEM (FIPS 203) scheme as a class 
     which contains the scheme parameters.
     """
-    def __init__(self, k: int, eta_1: int, eta_2: int, d_u: int, d_v: int):
-        self.pke = K_PKE(k, eta_1, eta_2, d_u, d_v)
+    def __init__(self, k: int, eta_1: int, eta_2: int, d_u: int, d_v: int, dk_cache_size: int = 128,
+                 decaps_cache_size: int = 0, decaps_cache_ttl: float = None,
+                 parallel: bool = False, parallel_min_k: int = 4):
+        self.pke = K_PKE(k, eta_1, eta_2, d_u, d_v, parallel, parallel_min_k)
+
+        # Expanded seed-form decapsulation keys, seed -> (ek, dk), filled by decapsulations only.
+        # Unlike the Decaps results below, the expanded keys are immutable bytes which are not
+        # wiped when they leave the cache: they stay in memory until garbage collected.
+        self.dk_cache = LRUCache(dk_cache_size)
+        self.expansions = 0
+        self.expansion_time = 0.0
+
+        # Results of Decaps for retransmitted ciphertexts, H(H(dk) || c) -> K (disabled by default)
+        self.decaps_cache = LRUCache(decaps_cache_size, decaps_cache_ttl, on_evict=_wipe)
+
+    @classmethod
+    def from_parameter_set(cls, name: int, **kwargs):
+        """
+        Builds the scheme for one of the parameter sets ML-KEM-512, ML-KEM-768 or ML-KEM-1024
+        """
+        if name not in PARAMETER_SETS:
+            raise ValueError(f"Unknown parameter set ML-KEM-{name}")
+        return cls(**PARAMETER_SETS[name], **kwargs)
+
+    @property
+    def parameter_set(self):
+        """
+        Name (512, 768 or 1024) of the parameter set used, or None for non-standard parameters
+        """
+        params = {"k": self.pke.k, "eta_1": self.pke.eta_1, "eta_2": self.pke.eta_2, "d_u": self.pke.d_u, "d_v": self.pke.d_v}
+        for name, values in PARAMETER_SETS.items():
+            if values == params:
+                return name
+        return None
 
     """ 
     Algorithm 16 : ML-KEM.KeyGen_internal(d, z)
@@ -51,13 +96,16 @@ class ML_KEM:
     Output : shared secret key K in B^32
     """
     def Decaps_internal(self, dk: bytes, c: bytes):
+        # Views over the given buffers, so that dk is split without copies
+        dk = byte_view(dk)
+        c = byte_view(c)
         dk_pke = dk[:384 * self.pke.k]
         ek_pke = dk[384 * self.pke.k:768 * self.pke.k + 32]
         h = dk[768 * self.pke.k + 32:768 * self.pke.k + 64]
         z = dk[768 * self.pke.k + 64:]
         m_prime = self.pke.Decrypt(dk_pke, c)
         K_prime, r_prime = G(m_prime + h)
-        K_bar = J(z + c)
+        K_bar = J(b"".join((z, c)))
         c_prime = self.pke.Encrypt(ek_pke, m_prime, r_prime)
 
         if c != c_prime:
@@ -102,9 +150,197 @@ class ML_KEM:
     Output : shared secret key K in B^32
     """
     def Decaps(self, dk: bytes, c: bytes):
+        cache_key = None
+        if self.decaps_cache.maxsize > 0:
+            # The key ID is the hash of dk as given, so that a hit skips the expansion of seed-form keys
+            cache_key = H(H(dk) + c)
+            K_cached = self.decaps_cache.get(cache_key)
+            if K_cached is not None:
+                return bytes(K_cached)
+
+        if len(dk) == SEED_DK_LENGTH:
+            _, dk = self.expand_dk(dk)
+
         K_prime = self.Decaps_internal(dk, c)
+
+        if cache_key is not None:
+            self.decaps_cache.put(cache_key, bytearray(K_prime))
         return K_prime
 
+    """ 
+    Encapsulation key check (section 7.2)
+    Type check on the length of ek, then modulus check: every coefficient of t_ntt must be in Z_Q,
+    i.e. ByteEncode_12(ByteDecode_12(ek)) must give back ek. The coefficients are compared with Q
+    directly on the encoded bytes (coefficients_below_Q), without decoding them.
+
+    Input : encapsulation key ek
+    Output : True if ek passes the checks
+    """
+    def check_ek(self, ek: bytes) -> bool:
+        k = self.pke.k
+        if len(ek) != 384*k + 32:
+            return False
+        return coefficients_below_Q(ek[:384*k])
+
+    """ 
+    Decapsulation key check (section 7.3)
+    Type check on the length of dk, then hash check: dk must contain H(ek) of the ek it contains.
+    A seed-form key always passes, since the full key is derived from it.
+
+    Input : decapsulation key dk
+    Output : True if dk passes the checks
+    """
+    def check_dk(self, dk: bytes) -> bool:
+        k = self.pke.k
+        if len(dk) == SEED_DK_LENGTH:
+            return True
+        if len(dk) != 768*k + 96:
+            return False
+        return H(dk[384*k:768*k + 32]) == dk[768*k + 32:768*k + 64]
+
+    """ 
+    Runs the checks of check_ek over many encapsulation keys at once.
+    The keys are taken VALIDATION_SLICE at a time: the t_ntt parts of a slice are checked together
+    by out_of_range_flags, then each key only looks for a flag in its own range.
+    Memory use is therefore bounded by the size of a slice, whatever the number of keys.
+
+    Input : iterable of encapsulation keys
+    Output : list of verdicts, one per key
+    """
+    def validate_ek_batch(self, eks) -> list:
+        eks = iter(eks)
+        verdicts = []
+        while True:
+            keys = list(islice(eks, VALIDATION_SLICE))
+            if not keys:
+                return verdicts
+            verdicts += self._validate_ek_slice(keys)
+
+    def _validate_ek_slice(self, eks: list) -> list:
+        k = self.pke.k
+        verdicts = [len(ek) == 384*k + 32 for ek in eks]
+
+        t_parts = b"".join(bytes(ek[:384*k]) for ek, ok in zip(eks, verdicts) if ok)
+        flags = out_of_range_flags(t_parts)
+
+        start = 0
+        for i, ok in enumerate(verdicts):
+            if ok:
+                verdicts[i] = flags.find(1, start, start + 128*k) == -1
+                start += 128*k
+        return verdicts
+
+    """ 
+    Runs the checks of check_dk over many decapsulation keys.
+    The hash check needs one H per key, so only the per-key Python overhead is reduced.
+
+    Input : iterable of decapsulation keys
+    Output : list of verdicts, one per key
+    """
+    def validate_dk_batch(self, dks) -> list:
+        k = self.pke.k
+        length = 768*k + 96
+        ek_start, ek_end, h_end = 384*k, 768*k + 32, 768*k + 64
+        return [
+            len(dk) == SEED_DK_LENGTH or (len(dk) == length and H(dk[ek_start:ek_end]) == dk[ek_end:h_end])
+            for dk in dks
+        ]
+
+    """ 
+    ML-KEM.KeyGen() returning the decapsulation key in seed form.
+    The full key is completely determined by (d, z), see Algorithm 16.
+
+    Output : encapsulation key ek in B^(384*k + 32)
+    Output : seed-form decapsulation key d || z in B^64
+    """
+    def KeyGen_seed(self):
+        seed = secrets.token_bytes(SEED_DK_LENGTH)
+        # Not through expand_dk: generating many keys must not push the hot ones out of the cache
+        ek, _ = self.KeyGen_internal(seed[:32], seed[32:])
+        return ek, seed
+
+    """ 
+    Expands a seed-form decapsulation key through KeyGen_internal.
+    Recently used keys are kept in a bounded LRU cache so that hot keys are expanded only once.
+    The expanded keys are not wiped when they are evicted (see dk_cache).
+
+    Input : seed-form decapsulation key d || z in B^64
+    Output : encapsulation key ek in B^(384*k + 32)
+    Output : decapsulation key dk in B^(768*k + 96)
+    """
+    def expand_dk(self, seed: bytes):
+        if len(seed) != SEED_DK_LENGTH:
+            raise ValueError(f"Unauthorized length for the seed-form decapsulation key")
+
+        seed = bytes(seed)
+        keys = self.dk_cache.get(seed)
+        if keys is None:
+            start = time.perf_counter()
+            keys = self.KeyGen_internal(seed[:32], seed[32:])
+            self.expansion_time += time.perf_counter() - start
+            self.expansions += 1
+            self.dk_cache.put(seed, keys)
+        return keys
+
+    """ 
+    ML-KEM.Encaps(ek) writing into caller buffers.
+    ek may be any buffer-protocol object (e.g. a memoryview over a receive buffer).
+
+    Input : encapsulation key ek in B^(384*k + 32)
+    Input : writable buffer out_c of at least 32 * (d_u*k + d_v) bytes, receiving the ciphertext c
+    Input : writable buffer out_K of at least 32 bytes, receiving the shared secret key K
+    """
+    def encaps_into(self, ek, out_c, out_K):
+        out_K = byte_view(out_K)
+        # Checked before anything is written, so that a failure leaves both outputs untouched
+        if byte_view(out_c).readonly or out_K.readonly:
+            raise ValueError(f"Output buffers must be writable")
+        if len(out_K) < 32:
+            raise ValueError(f"Output buffer too small for the shared secret key")
+
+        m = secrets.token_bytes(32)
+        K, r = G(m + H(ek))
+        self.pke.Encrypt(ek, m, r, out_c)
+        out_K[:32] = K
+
+    """ 
+    ML-KEM.Decaps(dk, c) writing into a caller buffer.
+    dk (full or seed form) and c may be any buffer-protocol objects.
+
+    Input : decapsulation key dk in B^(768*k + 96)
+    Input : ciphertext c in B^(32 * (d_u*k + d_v))
+    Input : writable buffer out_K of at least 32 bytes, receiving the shared secret key K
+    """
+    def decaps_into(self, dk, c, out_K):
+        out_K = byte_view(out_K)
+        if out_K.readonly:
+            raise ValueError(f"Output buffers must be writable")
+        if len(out_K) < 32:
+            raise ValueError(f"Output buffer too small for the shared secret key")
+
+        out_K[:32] = self.Decaps(byte_view(dk), byte_view(c))
+
+    def cache_info(self) -> dict:
+        """
+        Statistics of the seed-form key cache (size, hit rate, time spent in expansions)
+        """
+        info = self.dk_cache.info()
+        info["expansions"] = self.expansions
+        info["expansion_time"] = self.expansion_time
+        return info
+
+    def decaps_cache_info(self) -> dict:
+        """
+        Statistics of the Decaps result cache (size, hits, misses, evictions, expirations)
+        """
+        return self.decaps_cache.info()
+
+    def clear_decaps_cache(self):
+        """
+        Wipes and drops every cached shared secret
+        """
+        self.decaps_cache.clear()
+
 # --- Example of use and test ---
 if __name__ == '__main__':
     # --------------------------------------------------
@@ -135,4 +371,31 @@ if __name__ == '__main__':
     K, c = kem_scheme.Encaps(ek)
 
     K_decaps = kem_scheme.Decaps(dk, c)
-    assert K_decaps == K
\ No newline at end of file
+    assert K_decaps == K
+
+    # --------------------------------------------------
+    # --- Testing of seed-form decapsulation keys ------
+    # --------------------------------------------------
+    ek, dk_seed = kem_scheme.KeyGen_seed()
+    assert len(dk_seed) == SEED_DK_LENGTH
+
+    K, c = kem_scheme.Encaps(ek)
+    assert kem_scheme.Decaps(dk_seed, c) == K
+    assert kem_scheme.cache_info()["expansions"] == 1 and kem_scheme.cache_info()["hits"] == 0
+
+    # --------------------------------------------------
+    # --- Testing of key checks ------------------------
+    # --------------------------------------------------
+    bad_ek = bytes([0xFF, 0xFF, 0xFF]) + ek[3:]
+    assert kem_scheme.check_ek(ek) and not kem_scheme.check_ek(bad_ek)
+    assert kem_scheme.validate_ek_batch([ek, bad_ek, ek[:-1]]) == [True, False, False]
+    assert kem_scheme.check_dk(dk) and kem_scheme.validate_dk_batch([dk, dk_seed, dk[:384*k] + bad_ek + dk[768*k + 32:]]) == [True, True, False]
+    # --------------------------------------------------
+    # --- Testing of buffer APIs -----------------------
+    # --------------------------------------------------
+    buffer = bytearray(len(ek) + 100)
+    buffer[100:] = ek
+    out_c, out_K, out_K_decaps = bytearray(len(c)), bytearray(32), bytearray(32)
+    kem_scheme.encaps_into(memoryview(buffer)[100:], out_c, out_K)
+    kem_scheme.decaps_into(memoryview(dk_seed), out_c, out_K_decaps)
+    assert out_K == out_K_decaps
\ No newline at end of file
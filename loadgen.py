@@ -0,0 +1,212 @@
+import argparse
+import json
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from constants import PARAMETER_SETS
+from kem_scheme import ML_KEM
+
+"""
+Load generator for ML_KEM.KeyGen / Encaps / Decaps.
+
+Several workers drive the scheme for a fixed duration with a weighted mix of operations,
+and the throughput, latency percentiles and CPU usage are reported as text or JSON.
+
+    python -m loadgen --param 768 --mix keygen:1,encaps:1,decaps:1 --workers 8 --duration 30s
+"""
+
+OPERATIONS = ("keygen", "encaps", "decaps")
+PERCENTILES = {"p50": 50, "p90": 90, "p99": 99, "p999": 99.9}
+
+def parse_duration(text: str) -> float:
+    """
+    Parses durations such as "500ms", "30s", "2m" or "30" (seconds)
+    """
+    units = (("ms", 0.001), ("s", 1), ("m", 60), ("h", 3600))
+    for suffix, factor in units:
+        if text.endswith(suffix) and not (suffix == "s" and text.endswith("ms")):
+            value = text[:-len(suffix)]
+            break
+    else:
+        value, factor = text, 1
+
+    try:
+        seconds = float(value) * factor
+    except ValueError:
+        raise ValueError(f"Invalid duration {text!r}") from None
+    if seconds <= 0:
+        raise ValueError(f"Invalid duration {text!r}")
+    return seconds
+
+def parse_mix(text: str) -> dict:
+    """
+    Parses an operation mix such as "keygen:1,encaps:2,decaps:2" into {operation: weight}
+    """
+    mix = {}
+    for item in text.split(","):
+        op, _, weight = item.strip().partition(":")
+        if op not in OPERATIONS:
+            raise ValueError(f"Unknown operation {op!r}")
+        try:
+            mix[op] = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for {op!r}") from None
+        if mix[op] < 0:
+            raise ValueError(f"Invalid weight for {op!r}")
+
+    if sum(mix.values()) <= 0:
+        raise ValueError(f"The operation mix is empty")
+    return mix
+
+def percentile(sorted_values: list, p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = -(-len(sorted_values) * p // 100)
+    return sorted_values[max(int(rank), 1) - 1]
+
+def _worker(param: int, mix: dict, reuse: float, duration: float, seed: int) -> dict:
+    """
+    Runs operations for `duration` seconds and returns their latencies, the CPU time used
+    and the length of the measured loop (which excludes the set-up of the worker).
+    Encaps and Decaps use the current key pair, which is replaced by a fresh one (outside of the
+    measurements) with probability 1 - reuse before each of them.
+    """
+    kem = ML_KEM.from_parameter_set(param)
+    rng = random.Random(seed)
+    ops, weights = list(mix), list(mix.values())
+    latencies = {op: [] for op in ops}
+
+    def fresh_keys():
+        ek, dk = kem.KeyGen()
+        _, c = kem.Encaps(ek)
+        return ek, dk, c
+
+    ek, dk, c = fresh_keys()
+    cpu_start = time.process_time()
+    loop_start = time.perf_counter()
+    end = loop_start + duration
+    while time.perf_counter() < end:
+        op = rng.choices(ops, weights)[0]
+        if op != "keygen" and rng.random() >= reuse:
+            ek, dk, c = fresh_keys()
+
+        start = time.perf_counter()
+        if op == "keygen":
+            kem.KeyGen()
+        elif op == "encaps":
+            kem.Encaps(ek)
+        else:
+            kem.Decaps(dk, c)
+        latencies[op].append(time.perf_counter() - start)
+
+    return {
+        "latencies": latencies,
+        "cpu_time": time.process_time() - cpu_start,
+        "loop_time": time.perf_counter() - loop_start,
+    }
+
+def run_loadgen(param: int = 768, mix: dict = None, workers: int = 1, duration: float = 10.0,
+                reuse: float = 1.0, threads: bool = False) -> dict:
+    """
+    Drives the scheme with `workers` concurrent workers (processes, or threads if `threads`)
+    and returns the report as a dictionary.
+    Throughputs are the sums of the rates of the workers over their measured loops, so that the
+    start of the pool, the construction of the schemes and the first key pairs are not counted.
+    """
+    if param not in PARAMETER_SETS:
+        raise ValueError(f"Unknown parameter set ML-KEM-{param}")
+    if workers < 1:
+        raise ValueError(f"Unauthorized value for workers")
+    if not 0 <= reuse <= 1:
+        raise ValueError(f"Unauthorized value for reuse")
+    if mix is None:
+        mix = {op: 1.0 for op in OPERATIONS}
+
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    with executor(max_workers=workers) as pool:
+        futures = [pool.submit(_worker, param, mix, reuse, duration, i) for i in range(workers)]
+        results = [future.result() for future in futures]
+    wall_time = time.perf_counter() - wall_start
+
+    # Threads share the CPU time of this process, processes report their own
+    if threads:
+        cpu_time = time.process_time() - cpu_start
+    else:
+        cpu_time = sum(result["cpu_time"] for result in results)
+
+    report = {
+        "parameter_set": f"ML-KEM-{param}",
+        "workers": workers,
+        "mode": "threads" if threads else "processes",
+        "duration": duration,
+        "reuse": reuse,
+        "wall_time": wall_time,
+        "loop_time": max(result["loop_time"] for result in results),
+        "cpu_time": cpu_time,
+        "cpu_percent": 100 * cpu_time / wall_time,
+        "total_ops": 0,
+        "throughput": 0.0,
+        "operations": {},
+    }
+    for op in mix:
+        values = sorted(v for result in results for v in result["latencies"][op])
+        throughput = sum(len(result["latencies"][op]) / result["loop_time"] for result in results)
+        report["operations"][op] = {
+            "count": len(values),
+            "throughput": throughput,
+            "mean_ms": 1000 * sum(values) / len(values) if values else 0.0,
+            **{f"{name}_ms": 1000 * percentile(values, p) for name, p in PERCENTILES.items()},
+        }
+        report["total_ops"] += len(values)
+        report["throughput"] += throughput
+    return report
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['parameter_set']} - {report['workers']} {report['mode']}, "
+        f"{report['wall_time']:.2f} s, key reuse {report['reuse']:g}",
+        f"{report['total_ops']} operations, {report['throughput']:.1f} ops/s, "
+        f"CPU {report['cpu_time']:.2f} s ({report['cpu_percent']:.0f} %)",
+        "",
+        f"{'operation':<10}{'count':>8}{'ops/s':>10}" + "".join(f"{name:>10}" for name in PERCENTILES) + "  (ms)",
+    ]
+    for op, stats in report["operations"].items():
+        lines.append(
+            f"{op:<10}{stats['count']:>8}{stats['throughput']:>10.1f}"
+            + "".join(f"{stats[name + '_ms']:>10.2f}" for name in PERCENTILES)
+        )
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="loadgen", description="Load generator for ML-KEM")
+    parser.add_argument("--param", type=int, default=768, choices=sorted(PARAMETER_SETS))
+    parser.add_argument("--mix", type=parse_mix, default="keygen:1,encaps:1,decaps:1",
+                        help="weighted operations, e.g. keygen:1,encaps:1,decaps:1")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--duration", type=parse_duration, default="10s", help="e.g. 500ms, 30s, 2m")
+    parser.add_argument("--reuse", type=float, default=1.0,
+                        help="probability that Encaps/Decaps reuse the current key pair")
+    parser.add_argument("--threads", action="store_true", help="use threads instead of processes")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run_loadgen(args.param, args.mix, args.workers, args.duration, args.reuse, args.threads)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
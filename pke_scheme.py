@@ -1,14 +1,44 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from constants import CONST_d
 from hash import G, PRF
 from polynomial import *
 from conversion import *
 
+# Persistent pool shared by every K_PKE in parallel mode, created on first use
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
+def get_worker_pool() -> ThreadPoolExecutor:
+    global _worker_pool
+    with _worker_pool_lock:
+        if _worker_pool is None:
+            _worker_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="k_pke")
+        return _worker_pool
+
+def _reset_worker_pool():
+    """
+    After a fork, the child has a copy of the pool but none of its threads: it starts a new one
+    """
+    global _worker_pool, _worker_pool_lock
+    _worker_pool = None
+    _worker_pool_lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_worker_pool)
+
 class K_PKE:
     """
     Implements the K-PKE (FIPS 203) scheme as a class 
     which contains the scheme parameters.
+
+    In parallel mode, the independent samplings of an operation (the SampleNTT of each entry of A,
+    the noise samples) are run concurrently on a persistent thread pool, for parameter sets
+    with k >= parallel_min_k only. Only their SHAKE computations overlap: the NTTs are pure Python,
+    holding the GIL, so they are left sequential.
     """
-    def __init__(self, k: int, eta_1: int, eta_2: int, d_u: int, d_v: int):
+    def __init__(self, k: int, eta_1: int, eta_2: int, d_u: int, d_v: int, parallel: bool = False, parallel_min_k: int = 4):
         if k not in (2, 3, 4):
             raise ValueError(f"Unauthorized value for k")
         if eta_1 not in (2, 3) or eta_2 not in (2, 3):
@@ -19,6 +49,33 @@ class K_PKE:
         self.eta_2 = eta_2
         self.d_u = d_u
         self.d_v = d_v
+        self.parallel = parallel
+        self.parallel_min_k = parallel_min_k
+
+    def _map(self, fn, items) -> list:
+        """
+        [fn(x) for x in items], run on the worker pool in parallel mode
+        """
+        if self.parallel and self.k >= self.parallel_min_k:
+            return list(get_worker_pool().map(fn, items))
+        return [fn(x) for x in items]
+
+    def _sample_matrix(self, rho: bytes) -> list:
+        """
+        A_ntt[i][j] = SampleNTT(rho || j || i)
+        """
+        seeds = [rho + bytes([j]) + bytes([i]) for i in range(self.k) for j in range(self.k)]
+        entries = self._map(lambda seed: DualPolynomial(ntt=SampleNTT(seed), copy=False), seeds)
+        return [entries[self.k*i : self.k*(i+1)] for i in range(self.k)]
+
+    def _sample_noise(self, seed: bytes, etas: list) -> list:
+        """
+        The i-th polynomial is SamplePolyCBD_eta(PRF_eta(seed, i)), with eta = etas[i]
+        """
+        return self._map(
+            lambda i: DualPolynomial(SamplePolyCBD(PRF(etas[i], seed, bytes([i])), etas[i]), copy=False),
+            range(len(etas)),
+        )
 
     """ 
     Algorithm 13 : K-PKE.KeyGen(d)
@@ -32,37 +89,22 @@ class K_PKE:
             raise ValueError(f"Unauthorized value for `d` seed length")
 
         rho, gamma = G(d + bytes([self.k]))
-        N_var = 0
 
-        A_ntt = []
-        for i in range(self.k):
-            temp_line = []
-            for j in range(self.k):
-                temp_line.append(SampleNTT(rho + bytes([j]) + bytes([i])))
-            A_ntt.append(temp_line)
+        A_ntt = self._sample_matrix(rho)
 
-        s = []
-        for i in range(self.k):
-            s.append(SamplePolyCBD(PRF(self.eta_1, gamma, bytes([N_var])), self.eta_1))
-            N_var += 1
-        
-        e = []
-        for i in range(self.k):
-            e.append(SamplePolyCBD(PRF(self.eta_1, gamma, bytes([N_var])), self.eta_1))
-            N_var += 1
-        
-        s_ntt = [NTT(poly) for poly in s]
-        e_ntt = [NTT(poly) for poly in e]
+        noise = self._sample_noise(gamma, [self.eta_1] * (2 * self.k))
+        s = noise[:self.k]
+        e = noise[self.k:]
 
         t_ntt = []
         for i in range(self.k):
-            pol_temp = PolynomialNTT()
+            pol_temp = DualPolynomial(ntt=PolynomialNTT(), copy=False)
             for j in range(self.k):
-                pol_temp = pol_temp + A_ntt[i][j] * s_ntt[j]
-            t_ntt.append(pol_temp + e_ntt[i])
+                pol_temp = pol_temp + A_ntt[i][j] * s[j]
+            t_ntt.append(pol_temp + e[i])
         
-        ek = b"".join([ByteEncode(poly.coeffs, CONST_d) for poly in t_ntt]) + rho
-        dk = b"".join([ByteEncode(poly.coeffs, CONST_d) for poly in s_ntt])
+        ek = b"".join([ByteEncode(poly.ntt.coeffs, CONST_d) for poly in t_ntt]) + rho
+        dk = b"".join([ByteEncode(poly.ntt.coeffs, CONST_d) for poly in s])
         
         return ek, dk
 
@@ -73,53 +115,57 @@ class K_PKE:
     Input : message m in B^32
     Input : randomness r in B^32
     Output : ciphertext c in B^(32 * (d_u * k + d_v))
+
+    ek and m may be any buffer-protocol object. If `out` is given, c is written into it
+    (a writable buffer of at least 32 * (d_u * k + d_v) bytes) and `out` is returned.
     """
-    def Encrypt(self, ek: bytes, m: bytes, r: bytes):
+    def Encrypt(self, ek: bytes, m: bytes, r: bytes, out=None):
+        ek = byte_view(ek)
         if len(ek) != 384*self.k + 32 or len(m) != 32 or len(r) != 32:
             raise ValueError(f"Unauthorized length for ek, m or r")
+        if out is not None and len(byte_view(out)) < 32*(self.d_u*self.k + self.d_v):
+            raise ValueError(f"Output buffer too small for the ciphertext")
         
-        N_var = 0
-        t_ntt = [PolynomialNTT(ByteDecode(ek[384*i : 384*(i+1)], CONST_d)) for i in range(self.k)]
-        rho = ek[384*self.k:]
+        t_ntt = [DualPolynomial(ntt=PolynomialNTT(ByteDecode(ek[384*i : 384*(i+1)], CONST_d)), copy=False) for i in range(self.k)]
+        rho = bytes(ek[384*self.k:])
+
+        A_ntt = self._sample_matrix(rho)
 
-        A_ntt = []
+        noise = self._sample_noise(bytes(r), [self.eta_1] * self.k + [self.eta_2] * (self.k + 1))
+        y = noise[:self.k]
+        e_1 = noise[self.k:2*self.k]
+        e_2 = noise[2*self.k]
+
+        u_ntt = []
         for i in range(self.k):
-            temp_line = []
+            pol_temp = DualPolynomial(ntt=PolynomialNTT(), copy=False)
             for j in range(self.k):
-                temp_line.append(SampleNTT(rho + bytes([j]) + bytes([i])))
-            A_ntt.append(temp_line)
+                pol_temp = pol_temp + A_ntt[j][i] * y[j]
+            u_ntt.append(pol_temp)
 
-        y = []
+        v_ntt_temp = DualPolynomial(ntt=PolynomialNTT(), copy=False)
         for i in range(self.k):
-            y.append(SamplePolyCBD(PRF(self.eta_1, r, bytes([N_var])), self.eta_1))
-            N_var += 1
+            v_ntt_temp += t_ntt[i] * y[i]
 
-        e_1 = []
-        for i in range(self.k):
-            e_1.append(SamplePolyCBD(PRF(self.eta_2, r, bytes([N_var])), self.eta_2))
-            N_var += 1
+        mu = DualPolynomial(Polynomial([Decompress(b, 1) for b in ByteDecode(m, 1)]), copy=False)
 
-        e_2 = SamplePolyCBD(PRF(self.eta_2, r, bytes([N_var])), self.eta_2)
-        y_ntt = [NTT(poly) for poly in y]
+        # The noise is the left operand, so that the sums are computed in coefficient form
+        # and u_ntt, v_ntt_temp go through inverse_NTT
+        u = [e_1[i] + u_ntt[i] for i in range(self.k)]
+        v = e_2 + v_ntt_temp + mu
 
-        u = []
-        for i in range(self.k):
-            pol_temp = PolynomialNTT()
-            for j in range(self.k):
-                pol_temp = pol_temp + A_ntt[j][i] * y_ntt[j]
-            u.append(inverse_NTT(pol_temp) + e_1[i])
-        
-        mu = Polynomial([Decompress(b, 1) for b in ByteDecode(m, 1)])
+        c_1 = [ByteEncode([Compress(coeff, self.d_u) for coeff in poly.poly.coeffs], self.d_u) for poly in u]
+        c_2 = ByteEncode([Compress(coeff, self.d_v) for coeff in v.poly.coeffs], self.d_v)
 
-        v_ntt_temp = PolynomialNTT()
-        for i in range(self.k):
-            v_ntt_temp += t_ntt[i] * y_ntt[i]
-        v = inverse_NTT(v_ntt_temp) + e_2 + mu
+        if out is None:
+            return b"".join(c_1) + c_2
 
-        c_1 = b"".join([ByteEncode([Compress(coeff, self.d_u) for coeff in poly.coeffs], self.d_u) for poly in u])
-        c_2 = ByteEncode([Compress(coeff, self.d_v) for coeff in v.coeffs], self.d_v)
-
-        return c_1 + c_2
+        view = byte_view(out)
+        offset = 0
+        for block in c_1 + [c_2]:
+            view[offset:offset + len(block)] = block
+            offset += len(block)
+        return out
 
     """ 
     Algorithm 15 : K-PKE.Decrypt(dk, c)
@@ -127,8 +173,12 @@ class K_PKE:
     Input : decryption key dk in B^(384*k)
     Input : ciphertext c in B^(32 * (d_u*k + d_v))
     Output : message m in B^32
+
+    dk and c may be any buffer-protocol object, they are sliced without copies.
     """
     def Decrypt(self, dk: bytes, c: bytes) -> bytes:
+        dk = byte_view(dk)
+        c = byte_view(c)
         if len(dk) != 384*self.k or len(c) != 32*(self.d_u*self.k + self.d_v):
             raise ValueError(f"Unauthorized length for ek, m or r")
 
@@ -138,16 +188,16 @@ class K_PKE:
         u_prime = []
         for i in range(self.k):
             decode = ByteDecode(c_1[32*self.d_u*i:32*self.d_u*(i+1)], self.d_u)
-            u_prime.append(Polynomial([Decompress(coeff, self.d_u) for coeff in decode]))
+            u_prime.append(DualPolynomial(Polynomial([Decompress(coeff, self.d_u) for coeff in decode]), copy=False))
 
-        v_prime = Polynomial([Decompress(coeff, self.d_v) for coeff in ByteDecode(c_2, self.d_v)])
+        v_prime = DualPolynomial(Polynomial([Decompress(coeff, self.d_v) for coeff in ByteDecode(c_2, self.d_v)]), copy=False)
 
-        s_ntt = [PolynomialNTT(ByteDecode(dk[384*i:384*(i+1)], CONST_d)) for i in range(self.k)]
-        pdt_temp = PolynomialNTT()
+        s_ntt = [DualPolynomial(ntt=PolynomialNTT(ByteDecode(dk[384*i:384*(i+1)], CONST_d)), copy=False) for i in range(self.k)]
+        pdt_temp = DualPolynomial(ntt=PolynomialNTT(), copy=False)
         for i in range(self.k):
-            pdt_temp += s_ntt[i] * NTT(u_prime[i])
-        w = v_prime - inverse_NTT(pdt_temp)
-        m = ByteEncode([Compress(coeff, 1) for coeff in w.coeffs], 1)
+            pdt_temp += s_ntt[i] * u_prime[i]
+        w = v_prime - pdt_temp
+        m = ByteEncode([Compress(coeff, 1) for coeff in w.poly.coeffs], 1)
         return m
 
 # --- Example of use and test ---
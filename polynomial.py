@@ -201,7 +201,7 @@ Input : Polynomial f in R_Q (Z_Q^N)
 Output : PolynomialNTT f_ntt in T_Q (Z_Q^N)
 """
 def NTT(f: Polynomial) -> PolynomialNTT:
-    C = f.coeffs.copy()
+    C = list(f.coeffs)
     i = 1
     len = 128
     while len > 1:
@@ -223,7 +223,7 @@ Input : PolynomialNTT f_ntt in T_Q (Z_Q^N)
 Output : Polynomial f in R_Q (Z_Q^N)
 """
 def inverse_NTT(f_ntt: PolynomialNTT) -> Polynomial:
-    C = f_ntt.coeffs.copy()
+    C = list(f_ntt.coeffs)
     i = 127
     len = 2 
     while len <= 128:
@@ -241,6 +241,119 @@ def inverse_NTT(f_ntt: PolynomialNTT) -> Polynomial:
 
     return Polynomial(C)
 
+def _freeze(form):
+    """
+    Makes a Polynomial / PolynomialNTT read-only by storing its coefficients in a tuple,
+    so that writing to it raises a TypeError
+    """
+    form.coeffs = tuple(form.coeffs)
+    return form
+
+class DualPolynomial:
+    """
+    Represents a polynomial of R_Q held in coefficient form (Polynomial), in NTT form (PolynomialNTT), or both.
+    A missing representation is computed with NTT / inverse_NTT the first time it is needed,
+    then kept until the polynomial is modified through __setitem__.
+
+    The forms held are read-only: the ones given to the constructor are copied (unless copy=False,
+    where the caller hands them over and must not use them anymore), and the ones returned by
+    the poly and ntt properties raise a TypeError when written to.
+    __setitem__ is the only way to modify the polynomial, and it drops the NTT form. The first write
+    copies the coefficient form once, later writes go to that copy until the poly property hands it out.
+
+    The sum of two polynomials is computed in a form held by both operands if there is one,
+    otherwise in the form held by the left operand. The product is computed in NTT form.
+    """
+    def __init__(self, poly: Polynomial = None, ntt: PolynomialNTT = None, copy: bool = True):
+        if poly is None and ntt is None:
+            poly, copy = Polynomial(), False
+
+        if copy:
+            poly = Polynomial(poly.coeffs) if poly is not None else None
+            ntt = PolynomialNTT(ntt.coeffs) if ntt is not None else None
+
+        self._poly = _freeze(poly) if poly is not None else None
+        self._ntt = _freeze(ntt) if ntt is not None else None
+        # True when _poly is a private copy taking the writes of __setitem__
+        self._writable = False
+        # Number of NTT / inverse_NTT computed by this polynomial
+        self.transforms = 0
+
+    @property
+    def poly(self) -> Polynomial:
+        if self._poly is None:
+            self._poly = _freeze(inverse_NTT(self._ntt))
+            self.transforms += 1
+        elif self._writable:
+            self._poly = _freeze(self._poly)
+            self._writable = False
+        return self._poly
+
+    @property
+    def ntt(self) -> PolynomialNTT:
+        if self._ntt is None:
+            self._ntt = _freeze(NTT(self._poly))
+            self.transforms += 1
+        return self._ntt
+
+    @property
+    def domains(self):
+        """
+        Forms currently held, among "poly" and "ntt"
+        """
+        return tuple(name for name, form in (("poly", self._poly), ("ntt", self._ntt)) if form is not None)
+
+    def _in_ntt_domain(self, other) -> bool:
+        if self._poly is not None and other._poly is not None:
+            return False
+        if self._ntt is not None and other._ntt is not None:
+            return True
+        return self._poly is None
+
+    def __add__(self, other):
+        if not isinstance(other, DualPolynomial):
+            return NotImplemented
+
+        if self._in_ntt_domain(other):
+            return DualPolynomial(ntt=self.ntt + other.ntt, copy=False)
+        return DualPolynomial(self.poly + other.poly, copy=False)
+
+    def __sub__(self, other):
+        if not isinstance(other, DualPolynomial):
+            return NotImplemented
+
+        if self._in_ntt_domain(other):
+            return DualPolynomial(ntt=self.ntt - other.ntt, copy=False)
+        return DualPolynomial(self.poly - other.poly, copy=False)
+
+    def __mul__(self, other):
+        if not isinstance(other, DualPolynomial):
+            return NotImplemented
+
+        return DualPolynomial(ntt=self.ntt * other.ntt, copy=False)
+
+    def __eq__(self, other):
+        if not isinstance(other, DualPolynomial):
+            return NotImplemented
+
+        return self.poly == other.poly
+
+    def __repr__(self):
+        return repr(self.poly)
+
+    def __getitem__(self, index):
+        # Reads from the writable copy as is, so that mixing reads and writes does not copy again
+        if self._poly is None:
+            return self.poly[index]
+        return self._poly[index]
+
+    def __setitem__(self, index, value):
+        if not self._writable:
+            self._poly = Polynomial(self.poly.coeffs)
+            self._writable = True
+        self._poly[index] = value
+        self._ntt = None
+
 # --- Example of use and test ---
 if __name__ == '__main__':
     a = Polynomial([1, 0, 2, 3, 18, 32, 72, 21, 23, 1, 0, 9, 287, 23] + [0] * (N - 14))
@@ -249,4 +362,10 @@ if __name__ == '__main__':
 
     p1 = Polynomial([1, 2, 4, 4, 3, 1, 6, 6, 4, 3] + [0]*246)
     p2 = Polynomial([3, 4, 8, 10, 27, 273, 12, 982, 12, 42, 9] + [0]*245)
-    assert inverse_NTT(NTT(p1) * NTT(p2)) == p1 * p2
\ No newline at end of file
+    assert inverse_NTT(NTT(p1) * NTT(p2)) == p1 * p2
+
+    d1, d2 = DualPolynomial(p1), DualPolynomial(p2)
+    assert (d1 * d2).poly == p1 * p2
+    assert (d1 + d2).domains == ("poly",) and d1.transforms == 1
+    d1[0] = 5
+    assert d1.domains == ("poly",) and d1[0] == 5 and p1[0] == 1
\ No newline at end of file
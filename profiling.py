@@ -0,0 +1,252 @@
+import functools
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+from polynomial import Polynomial, PolynomialNTT
+
+"""
+Opt-in memory profiling of the K_PKE / ML_KEM operations.
+
+For every profiled call, the following is recorded:
+- peak_bytes : highest amount of memory allocated during the call (tracemalloc), above its starting point
+- net_bytes, net_blocks : memory and number of blocks still allocated when the call returns
+- polynomials : number of Polynomial / PolynomialNTT objects created during the call
+- gc_collections : number of garbage collections run during the call, per generation.
+  CPython starts a generation 0 collection every gc.get_threshold()[0] container allocations
+  net of deallocations, so short-lived objects only show up in peak_bytes and polynomials.
+- time : wall time of the call (slowed down by tracemalloc, only meaningful between profiled runs)
+
+Memory, polynomial and collection figures are process-wide: they include the work done on
+other threads during the call, such as the K_PKE worker pool in parallel mode, but also any
+unrelated thread. Profile in a process running nothing else for exact attribution.
+
+tracemalloc has a single peak for the whole process, which is reset when a profiled call starts.
+Concurrent profiled calls on several threads are therefore unsupported: a call starting on one
+thread wipes the peak of a call in progress on another, and peak_bytes is wrong for the latter.
+"""
+
+PROFILED_METHODS = {
+    "ML_KEM": ("KeyGen", "Encaps", "Decaps"),
+    "K_PKE": ("KeyGen", "Encrypt", "Decrypt"),
+}
+
+class _Frame:
+    def __init__(self, name: str):
+        self.name = name
+        self.start_bytes = tracemalloc.get_traced_memory()[0]
+        self.start_blocks = sys.getallocatedblocks()
+        self.start_collections = [0, 0, 0]
+        self.start_polynomials = 0
+        self.child_peak = 0
+        self.start_time = time.perf_counter()
+
+class AllocationProfiler:
+    """
+    Records the allocations of profiled calls.
+
+    with AllocationProfiler(kem) as profiler:
+        kem.Encaps(ek)
+    profiler.records  # one entry per call of ML_KEM.Encaps, K_PKE.Encrypt, ...
+
+    Nested calls are recorded separately, and the peak of the outer call includes the inner ones.
+    Each thread has its own stack of calls in progress, and the counters are updated under a lock,
+    but profiled calls must not run concurrently for peak_bytes to be right (see above).
+
+    Several profilers may patch the same scheme, provided that they are stopped in the reverse
+    order of their start, like nested with blocks.
+    """
+    def __init__(self, *schemes):
+        self.schemes = schemes
+        self.records = []
+        self._local = threading.local()
+        # Reentrant, as a collection (and its callback) may start while the lock is held
+        self._lock = threading.RLock()
+        self._collections = [0, 0, 0]
+        self._polynomials = 0
+        self._patched = []
+        self._started_tracing = False
+
+    @property
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            with self._lock:
+                self._collections[info["generation"]] += 1
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        gc.callbacks.append(self._on_gc)
+
+        for cls in (Polynomial, PolynomialNTT):
+            self._patch_init(cls)
+        for scheme in self.schemes:
+            self._patch(scheme)
+            if hasattr(scheme, "pke"):
+                self._patch(scheme.pke)
+        return self
+
+    def stop(self):
+        # The attributes found when starting are put back: the original __init__ on the classes,
+        # and on the instances either nothing or the wrapper of a profiler started before this one
+        for target, name, original in reversed(self._patched):
+            if original is None:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+        self._patched = []
+
+        if self._on_gc in gc.callbacks:
+            gc.callbacks.remove(self._on_gc)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _patch_init(self, cls):
+        init = cls.__init__
+
+        @functools.wraps(init)
+        def counting_init(obj, *args, **kwargs):
+            with self._lock:
+                self._polynomials += 1
+            init(obj, *args, **kwargs)
+
+        cls.__init__ = counting_init
+        self._patched.append((cls, "__init__", init))
+
+    def _patch(self, scheme):
+        class_name = type(scheme).__name__
+        for name in PROFILED_METHODS.get(class_name, ()):
+            method = getattr(scheme, name)
+            previous = vars(scheme).get(name)
+            setattr(scheme, name, self.wrap(method, f"{class_name}.{name}"))
+            self._patched.append((scheme, name, previous))
+
+    def wrap(self, fn, name: str = None):
+        """
+        Returns a version of `fn` whose calls are recorded under `name`
+        """
+        name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            with self.track(name):
+                return fn(*args, **kwargs)
+        return profiled
+
+    def track(self, name: str):
+        return _Tracker(self, name)
+
+    def _enter(self, name: str):
+        if self._stack:
+            # The peak is reset for the inner call, keep the one of the outer call so far
+            parent = self._stack[-1]
+            parent.child_peak = max(parent.child_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+        frame = _Frame(name)
+        with self._lock:
+            frame.start_collections = self._collections.copy()
+            frame.start_polynomials = self._polynomials
+        self._stack.append(frame)
+
+    def _exit(self):
+        frame = self._stack.pop()
+        current, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, frame.child_peak)
+        with self._lock:
+            collections = [n - m for n, m in zip(self._collections, frame.start_collections)]
+            polynomials = self._polynomials - frame.start_polynomials
+
+        record = {
+            "name": frame.name,
+            "depth": len(self._stack),
+            "peak_bytes": peak - frame.start_bytes,
+            "net_bytes": current - frame.start_bytes,
+            "net_blocks": sys.getallocatedblocks() - frame.start_blocks,
+            "polynomials": polynomials,
+            "gc_collections": collections,
+            "time": time.perf_counter() - frame.start_time,
+        }
+        with self._lock:
+            self.records.append(record)
+
+        if self._stack:
+            self._stack[-1].child_peak = max(self._stack[-1].child_peak, peak)
+
+    def summary(self) -> dict:
+        """
+        Aggregates the records per operation name
+        """
+        result = {}
+        for record in self.records:
+            stats = result.setdefault(record["name"], {
+                "calls": 0, "max_peak_bytes": 0, "max_polynomials": 0, "total_gc_collections": 0, "total_time": 0.0,
+            })
+            stats["calls"] += 1
+            stats["max_peak_bytes"] = max(stats["max_peak_bytes"], record["peak_bytes"])
+            stats["max_polynomials"] = max(stats["max_polynomials"], record["polynomials"])
+            stats["total_gc_collections"] += sum(record["gc_collections"])
+            stats["total_time"] += record["time"]
+        return result
+
+    def report(self) -> str:
+        lines = [f"{'operation':<16}{'calls':>7}{'max peak (KiB)':>16}{'polynomials':>13}{'GC runs':>9}"]
+        for name, stats in self.summary().items():
+            lines.append(
+                f"{name:<16}{stats['calls']:>7}{stats['max_peak_bytes'] / 1024:>16.1f}{stats['max_polynomials']:>13}{stats['total_gc_collections']:>9}"
+            )
+        return "\n".join(lines)
+
+class _Tracker:
+    def __init__(self, profiler: AllocationProfiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+
+"""
+Profiles a single call.
+
+Input : function fn and its arguments
+Output : result of fn, and the record of the call
+"""
+def profile_call(fn, *args, **kwargs):
+    profiler = AllocationProfiler()
+    with profiler:
+        with profiler.track(getattr(fn, "__qualname__", "call")):
+            result = fn(*args, **kwargs)
+    return result, profiler.records[-1]
+
+# --- Example of use and test ---
+if __name__ == '__main__':
+    from kem_scheme import ML_KEM
+
+    kem_scheme = ML_KEM.from_parameter_set(768)
+    with AllocationProfiler(kem_scheme) as profiler:
+        ek, dk = kem_scheme.KeyGen()
+        K, c = kem_scheme.Encaps(ek)
+        assert kem_scheme.Decaps(dk, c) == K
+
+    print(profiler.report())
+    assert [r["name"] for r in profiler.records][-3:] == ["K_PKE.Decrypt", "K_PKE.Encrypt", "ML_KEM.Decaps"]
+    assert "KeyGen" not in kem_scheme.__dict__
+    assert Polynomial.__init__.__name__ == "__init__" and not hasattr(Polynomial.__init__, "__wrapped__")